@@ -1,112 +1,300 @@
 import os
+import hashlib
+import io
+import json
 import logging
+import queue
+import threading
 import time
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 import re
 from utils import selenium_utils, gdrive_utils, gsheet_utils
+from utils.logging_setup import configure_once
+from utils.url_tracker import URLTracker
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
 # Setup logging
-logging.basicConfig(
-    filename='error_logs.txt',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+configure_once()
 
 # Configuration from environment variables
 SPREADSHEET_ID = os.getenv('SPREADSHEET_ID')
 URL_RANGE = os.getenv('URL_RANGE')
 FOLDER_ID = os.getenv('FOLDER_ID')
 COOKIES_PATH = os.getenv('COOKIES_PATH')
-SCREENSHOTS_DIR = os.getenv('SCREENSHOTS_DIR', 'screenshots')
+BROWSER_WORKERS = int(os.getenv('BROWSER_WORKERS', '3'))
+UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', '4'))
+SHEETS_FLUSH_EVERY = int(os.getenv('SHEETS_FLUSH_EVERY', '25'))
+PENDING_METADATA_FILE = 'pending_metadata.json'
 
-def generate_screenshot_filename(url):
-    """Generate unique filename for screenshot"""
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    url_part = re.sub(r'[^\w\-_.]', '_', urlparse(url).netloc)[:50]
-    return f"screenshot_{timestamp}_{url_part}.png"
+class MetadataBuffer:
+    """Accumulates sheet writes and flushes them in one values.batchUpdate call.
 
-def process_url(url, row_index, driver, drive_service, sheets_service):
-    """Process a single URL with improved error handling"""
+    Unflushed rows are persisted to disk when a flush fails and replayed
+    into the buffer on the next run, so a crashed run is recovered without
+    re-capturing the screenshots.
+    """
+    def __init__(self, service, spreadsheet_id, flush_every=SHEETS_FLUSH_EVERY):
+        self.service = service
+        self.spreadsheet_id = spreadsheet_id
+        self.flush_every = flush_every
+        self.pending = self._load_pending()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load_pending():
+        """Replay rows a previous run persisted after a failed flush"""
+        if not os.path.exists(PENDING_METADATA_FILE):
+            return []
+        try:
+            with open(PENDING_METADATA_FILE, 'r') as f:
+                rows = [tuple(row) for row in json.load(f)]
+            os.remove(PENDING_METADATA_FILE)
+            if rows:
+                print(f"🔁 Recovered {len(rows)} unflushed metadata row(s) from previous run")
+                logging.info(f"Recovered {len(rows)} pending metadata row(s)")
+            return rows
+        except Exception as e:
+            logging.error(f"Could not recover pending metadata: {str(e)}")
+            return []
+
+    def add(self, range_name, values):
+        with self._lock:
+            self.pending.append((range_name, values))
+            if len(self.pending) >= self.flush_every:
+                try:
+                    self._flush_locked()
+                except Exception:
+                    # The rows stay buffered (and persisted) for a later
+                    # retry; the upload that triggered this flush succeeded
+                    # and must not be counted as failed.
+                    pass
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self.pending:
+            return
+        try:
+            gsheet_utils.batch_update_metadata(self.service, self.spreadsheet_id, self.pending)
+            print(f"✅ Flushed {len(self.pending)} metadata row(s) to sheet")
+            self.pending.clear()
+            # The flushed rows are on the sheet now; a stale pending file
+            # would be replayed next run, clobbering later manual edits
+            if os.path.exists(PENDING_METADATA_FILE):
+                os.remove(PENDING_METADATA_FILE)
+        except Exception as e:
+            logging.error(f"Metadata flush failed, persisting pending rows: {str(e)}")
+            try:
+                with open(PENDING_METADATA_FILE, 'w') as f:
+                    json.dump(self.pending, f)
+                print(f"⚠️ Metadata flush failed; {len(self.pending)} row(s) saved to {PENDING_METADATA_FILE}")
+            except Exception as persist_error:
+                logging.error(f"Could not persist pending metadata: {str(persist_error)}")
+            raise
+
+class ScreenshotHashIndex:
+    """Maps screenshot content hashes to already-uploaded Drive files.
+
+    Identical pages (error pages, redirects to the same landing page)
+    render byte-identical screenshots; hashing the buffer lets the upload
+    stage reuse the existing Drive file instead of pushing a duplicate.
+    """
+    def __init__(self, tracker):
+        self._lock = threading.Lock()
+        self._by_hash = {}
+        for record in tracker.processed_urls.values():
+            metadata = record.get('metadata', {})
+            if metadata.get('sha') and metadata.get('file_id'):
+                self._by_hash[metadata['sha']] = (metadata['file_id'], metadata.get('web_link'))
+
+    @staticmethod
+    def digest(screenshot_buffer):
+        return hashlib.blake2b(screenshot_buffer.getvalue(), digest_size=16).hexdigest()
+
+    def get(self, sha):
+        with self._lock:
+            return self._by_hash.get(sha)
+
+    def add(self, sha, file_id, web_link):
+        with self._lock:
+            self._by_hash.setdefault(sha, (file_id, web_link))
+
+_SAFE_FILENAME_RE = re.compile(r'[^\w\-_.]')
+
+def generate_screenshot_filename(url, row_index):
+    """Generate unique filename for screenshot.
+
+    The row index keeps names unique when parallel workers capture
+    same-domain URLs within the same second.
+    """
+    timestamp = time.strftime('%Y%m%d_%H%M%S')
+    try:
+        # For http(s) URLs the netloc is simply the third slash-split part;
+        # much cheaper than a full urlparse
+        netloc = url.split('/', 3)[2]
+    except IndexError:
+        netloc = urlparse(url).netloc
+    url_part = _SAFE_FILENAME_RE.sub('_', netloc)[:50]
+    return f"screenshot_{timestamp}_row{row_index + 1}_{url_part}.{selenium_utils.SCREENSHOT_FORMAT}"
+
+def capture_url(url, row_index, driver, skip_urls):
+    """Capture stage: navigate and screenshot on the browser thread.
+
+    Returns (screenshot_buffer, screenshot_filename, page_title) on
+    success, None when the URL should be skipped.
+    """
+    if url in skip_urls:
+        print(f"⏩ Skipping URL (already processed): {url}")
+        logging.info(f"Skipped already processed URL: {url}")
+        return None
+
+    if not url.strip().startswith(('http://', 'https://')):
+        print(f"❌ Invalid URL format: {url}")
+        logging.error(f"Invalid URL format: {url}")
+        raise ValueError(f"Invalid URL format: {url}")
+
+    screenshot_filename = generate_screenshot_filename(url, row_index)
+    screenshot_buffer = io.BytesIO()
+
+    print(f"\n📸 Processing URL ({row_index + 1}): {url}")
+    page_title = selenium_utils.capture_full_page_screenshot(driver, url, screenshot_buffer)
+    print(f"✅ Screenshot captured: {screenshot_filename}")
+    return screenshot_buffer, screenshot_filename, page_title
+
+def upload_and_record(screenshot_buffer, screenshot_filename, page_title, row_index, url,
+                      metadata_buffer, tracker, hash_index):
+    """Upload stage: stream the screenshot to Drive and record metadata in the sheet.
+
+    Runs on the upload executor so the browser thread can move on to the
+    next URL while bytes are in flight. Byte-identical screenshots reuse
+    the Drive file from the first upload instead of being pushed again.
+    """
     try:
-        # Check if URL has already been processed
-        if gsheet_utils.is_url_processed(sheets_service, SPREADSHEET_ID, row_index):
-            print(f"⏩ Skipping URL (already processed): {url}")
-            logging.info(f"Skipped already processed URL: {url}")
-            return True
+        # Per-thread service: googleapiclient is not safe to share across
+        # the upload workers
+        drive_service = gdrive_utils.get_drive_service()
+        sha = hash_index.digest(screenshot_buffer)
+        existing = hash_index.get(sha)
+        if existing:
+            file_id, web_link = existing
+            print(f"♻️ Identical screenshot already on Drive, reusing: {web_link}")
+            logging.info(f"Reused Drive file {file_id} for duplicate screenshot of {url}")
+        else:
+            print("📤 Uploading to Google Drive...")
+            file_id, web_link = gdrive_utils.upload_stream(
+                drive_service, screenshot_buffer, screenshot_filename, FOLDER_ID
+            )
+            hash_index.add(sha, file_id, web_link)
+            print(f"✅ Uploaded to Drive: {web_link}")
 
-        if not url.strip().startswith(('http://', 'https://')):
-            print(f"❌ Invalid URL format: {url}")
-            logging.error(f"Invalid URL format: {url}")
-            return False
+        file_metadata = gdrive_utils.get_file_metadata(drive_service, file_id)
 
         metadata_range = f'Sheet1!B{row_index + 2}:D{row_index + 2}'
-        screenshot_filename = generate_screenshot_filename(url)
-        screenshot_path = os.path.join(SCREENSHOTS_DIR, screenshot_filename)
-        
-        os.makedirs(SCREENSHOTS_DIR, exist_ok=True)
-        
-        max_retries = 3
-        retry_count = 0
-        
-        while retry_count < max_retries:
-            try:
-                print(f"\n📸 Processing URL ({row_index + 1}): {url}")
-                # Capture screenshot
-                page_title = selenium_utils.capture_full_page_screenshot(driver, url, screenshot_path)
-                print(f"✅ Screenshot captured: {screenshot_filename}")
-                
-                # Upload to Drive
-                print("📤 Uploading to Google Drive...")
-                if not FOLDER_ID:
-                    raise Exception("Google Drive folder ID not configured in .env file")
-                    
-                file_id, web_link = gdrive_utils.upload_file(drive_service, screenshot_path, FOLDER_ID)
-                file_metadata = gdrive_utils.get_file_metadata(drive_service, file_id)
-                print(f"✅ Uploaded to Drive: {web_link}")
-                
-                # Update sheet
-                print("📝 Updating Google Sheet...")
-                metadata = [[page_title, web_link, file_metadata.get('thumbnailLink', '')]]
-                gsheet_utils.update_metadata(
-                    sheets_service,
-                    SPREADSHEET_ID,
-                    metadata_range,
-                    metadata
-                )
-                print("✅ Sheet updated successfully")
-                
-                # Cleanup
-                if os.path.exists(screenshot_path):
-                    os.remove(screenshot_path)
-                    
-                logging.info(f"Successfully processed URL: {url}")
-                print(f"✅ Successfully processed URL: {url}\n")
-                return True
-                
-            except Exception as e:
-                retry_count += 1
-                if retry_count == max_retries:
-                    print(f"❌ Failed to process URL after {max_retries} attempts: {str(e)}")
-                    logging.error(f"Failed to process URL {url}: {str(e)}")
-                    return False
-                    
-                print(f"\n⚠️ Attempt {retry_count} failed: {str(e)}")
-                print(f"⏳ Retrying in {2 ** retry_count} seconds...")
-                time.sleep(2 ** retry_count)
-                
+        metadata = [[page_title, web_link, file_metadata.get('thumbnailLink', '')]]
+        metadata_buffer.add(metadata_range, metadata)
+
+        tracker.mark_url_processed(url, {'file_id': file_id, 'web_link': web_link, 'sha': sha})
+
+        logging.info(f"Successfully processed URL: {url}")
+        print(f"✅ Successfully processed URL: {url}\n")
+        return True
     except Exception as e:
-        print(f"❌ Error processing URL: {str(e)}")
-        logging.error(f"Error processing URL {url}: {str(e)}")
+        print(f"❌ Upload failed for URL: {url}: {str(e)}")
+        logging.error(f"Upload failed for URL {url}: {str(e)}")
         return False
 
+def browser_worker(url_queue, driver_pool, upload_executor, upload_futures, futures_lock,
+                   skip_urls, metadata_buffer, tracker, hash_index, counters):
+    """Pull URLs from the queue on a pooled browser session.
+
+    Capture retries stay on the browser thread; the upload/sheet stage is
+    handed off to the upload executor so navigation and network I/O overlap.
+    """
+    driver = None
+    try:
+        driver = driver_pool.acquire()
+
+        while True:
+            try:
+                row_index, url = url_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            max_retries = 3
+            retry_count = 0
+            while retry_count < max_retries:
+                try:
+                    result = capture_url(url, row_index, driver, skip_urls)
+                    if result is None:
+                        counters.record(True)
+                        break
+
+                    screenshot_buffer, screenshot_filename, page_title = result
+                    future = upload_executor.submit(
+                        upload_and_record, screenshot_buffer, screenshot_filename,
+                        page_title, row_index, url, metadata_buffer,
+                        tracker, hash_index
+                    )
+                    with futures_lock:
+                        upload_futures.append((url, future))
+                    break
+                except ValueError as e:
+                    # Bad input (e.g. malformed URL), not a flaky page:
+                    # retrying or resetting the session cannot help
+                    print(f"❌ Skipping URL with invalid input: {str(e)}")
+                    logging.error(f"Invalid input for URL {url}: {str(e)}")
+                    counters.record(False)
+                    break
+                except Exception as e:
+                    retry_count += 1
+                    if retry_count == max_retries:
+                        print(f"❌ Failed to process URL after {max_retries} attempts: {str(e)}")
+                        logging.error(f"Failed to process URL {url}: {str(e)}")
+                        counters.record(False)
+                        break
+                    print(f"\n⚠️ Attempt {retry_count} failed: {str(e)}")
+                    print(f"⏳ Retrying in {2 ** retry_count} seconds...")
+                    selenium_utils.reset_session(driver)
+                    time.sleep(2 ** retry_count)
+    except Exception as e:
+        print(f"❌ Browser worker error: {str(e)}")
+        logging.error(f"Browser worker error: {str(e)}")
+    finally:
+        if driver:
+            driver_pool.release(driver)
+
+def _warm_drive_caches():
+    """Verify the Drive folder and prefetch its listing ahead of the first upload"""
+    try:
+        drive_service = gdrive_utils.get_drive_service()
+        clean_folder_id = gdrive_utils.verify_folder_access(drive_service, FOLDER_ID)
+        listing = gdrive_utils.list_folder_filenames(drive_service, clean_folder_id)
+        logging.info(f"Drive caches warmed: {len(listing)} file(s) in folder")
+    except Exception as e:
+        logging.warning(f"Drive cache warm-up failed: {str(e)}")
+
+class ResultCounters:
+    """Thread-safe success/failure tally shared by the workers"""
+    def __init__(self):
+        self.successful = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def record(self, success):
+        with self._lock:
+            if success:
+                self.successful += 1
+            else:
+                self.failed += 1
+
 def main():
     """Main execution function with improved error handling"""
-    driver = None
     try:
         # Validate environment variables
         missing_vars = []
@@ -121,61 +309,87 @@ def main():
 
         if missing_vars:
             raise Exception(f"Missing required environment variables: {', '.join(missing_vars)}. Please check your .env file.")
-            
+
         print("\n🔄 Initializing services...")
-        drive_service = gdrive_utils.get_drive_service()
+        # Validates credentials and permissions up front; the worker
+        # threads each build their own thread-local service later
+        gdrive_utils.get_drive_service()
         print("✅ Google Drive service initialized")
-        
+
         sheets_service = gsheet_utils.get_sheets_service()
         print("✅ Google Sheets service initialized")
-        
-        driver = selenium_utils.setup_driver()
-        
-        print("🍪 Loading cookies...")
-        selenium_utils.load_cookies(driver, COOKIES_PATH)
-        print("✅ Cookies loaded")
-        
+
         print("\n📋 Reading URLs from spreadsheet...")
         urls = gsheet_utils.read_urls(sheets_service, SPREADSHEET_ID, URL_RANGE)
-        
+
         if not urls:
             print("⚠️ No URLs found to process")
             logging.warning("No URLs found to process")
             return
-        
+
         total_urls = len(urls)
         print(f"📊 Found {total_urls} URLs to process")
-        
-        successful = 0
-        failed = 0
-        
+
+        print("🔍 Checking which URLs are already processed...")
+        tracker = URLTracker()
+        processed_rows = gsheet_utils.get_processed_rows(sheets_service, SPREADSHEET_ID, total_urls)
+        # Fuse the sheet mask and the local tracker into one set so the
+        # loop makes a single in-memory check per URL
+        skip_urls = frozenset(tracker.processed_urls) | {
+            urls[i] for i in processed_rows if i < len(urls)
+        }
+        if skip_urls:
+            print(f"⏩ {len(skip_urls)} URL(s) already processed")
+
+        url_queue = queue.Queue()
         for i, url in enumerate(urls):
-            print(f"\n[Progress: {i+1}/{total_urls}]")
-            success = process_url(url, i, driver, drive_service, sheets_service)
-            if success:
-                successful += 1
-            else:
-                failed += 1
-                print(f"❌ Failed to process URL: {url}")
-            
-            if i < len(urls) - 1:
-                print("⏳ Waiting 3 seconds before next URL...")
-                time.sleep(3)  # Increased delay between requests
-        
+            url_queue.put((i, url))
+
+        counters = ResultCounters()
+        upload_futures = []
+        futures_lock = threading.Lock()
+        metadata_buffer = MetadataBuffer(sheets_service, SPREADSHEET_ID)
+        hash_index = ScreenshotHashIndex(tracker)
+
+        worker_count = min(BROWSER_WORKERS, total_urls)
+        print(f"🚀 Starting {worker_count} browser worker(s), {UPLOAD_WORKERS} upload worker(s)")
+
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as upload_executor:
+            # Verify the Drive folder and prefetch its listing while the
+            # browser pool spins up, so the first upload finds warm caches
+            upload_executor.submit(_warm_drive_caches)
+
+            driver_pool = selenium_utils.DriverPool(worker_count, COOKIES_PATH)
+            try:
+                with ThreadPoolExecutor(max_workers=worker_count) as browser_executor:
+                    workers = [
+                        browser_executor.submit(
+                            browser_worker, url_queue, driver_pool, upload_executor,
+                            upload_futures, futures_lock, skip_urls,
+                            metadata_buffer, tracker, hash_index, counters
+                        )
+                        for _ in range(worker_count)
+                    ]
+                    for worker in workers:
+                        worker.result()
+
+                for url, future in upload_futures:
+                    counters.record(future.result())
+
+                metadata_buffer.flush()
+            finally:
+                print("\n🔄 Closing browser sessions...")
+                driver_pool.close_all()
+
         print(f"\n✨ Process completed!")
         print(f"📊 Summary:")
-        print(f"   ✅ Successful: {successful}")
-        print(f"   ❌ Failed: {failed}")
+        print(f"   ✅ Successful: {counters.successful}")
+        print(f"   ❌ Failed: {counters.failed}")
         print(f"   📊 Total: {total_urls}\n")
-                
+
     except Exception as e:
         print(f"❌ Main execution error: {str(e)}")
         logging.error(f"Main execution error: {str(e)}")
-    finally:
-        if driver:
-            print("\n🔄 Closing Chrome WebDriver...")
-            selenium_utils.close_driver(driver)
-            print("✅ Chrome WebDriver closed")
 
 if __name__ == "__main__":
     main()
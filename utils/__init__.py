@@ -2,8 +2,9 @@
 Utility modules for web scraping, Google Drive integration, and Google Sheets operations.
 """
 
+from . import logging_setup
 from . import selenium_utils
 from . import gdrive_utils
 from . import gsheet_utils
 
-__all__ = ['selenium_utils', 'gdrive_utils', 'gsheet_utils']
+__all__ = ['logging_setup', 'selenium_utils', 'gdrive_utils', 'gsheet_utils']
@@ -1,10 +1,14 @@
 from google.oauth2.credentials import Credentials
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload
 from googleapiclient.errors import HttpError
+import functools
 import logging
+import mimetypes
 import os
+import sys
+import threading
 import time
 
 # Update scopes to include full Drive access
@@ -15,50 +19,83 @@ SCOPES = [
 ]
 MAX_RETRIES = 3
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB limit
+# Below this size a single multipart POST beats a resumable session
+# (which costs an extra initiation round trip per upload)
+RESUMABLE_THRESHOLD = 5 * 1024 * 1024
+
+@functools.lru_cache(maxsize=1)
+def _get_drive_credentials():
+    """Load and cache the service-account credentials once per process"""
+    if not os.path.exists('credentials.json'):
+        raise FileNotFoundError("credentials.json not found")
+    return service_account.Credentials.from_service_account_file(
+        'credentials.json',
+        scopes=SCOPES
+    )
+
+# One service per thread: googleapiclient services sit on httplib2, which
+# is not thread-safe, and uploads run on a thread pool. Credentials (the
+# expensive part) are still loaded once per process.
+_thread_services = threading.local()
+_drive_verified = threading.Event()
 
 def get_drive_service():
-    """Initialize Google Drive service with improved error handling"""
+    """Initialize the Google Drive service for the calling thread (cached).
+
+    Each thread keeps its own service so concurrent execute()/next_chunk()
+    calls never interleave on a shared HTTP connection; the permission
+    check runs only on the first service built in the process.
+    """
+    service = getattr(_thread_services, 'drive', None)
+    if service is not None:
+        return service
+
     try:
-        if not os.path.exists('credentials.json'):
-            raise FileNotFoundError("credentials.json not found")
-            
-        credentials = service_account.Credentials.from_service_account_file(
-            'credentials.json', 
-            scopes=SCOPES
-        )
-        service = build('drive', 'v3', credentials=credentials)
-        
-        # Verify service account permissions
-        try:
-            about = service.about().get(fields="user").execute()
-            logging.info(f"Drive service initialized for: {about.get('user', {}).get('emailAddress')}")
-        except HttpError as e:
-            if e.resp.status == 403:
-                logging.error("Service account lacks necessary permissions. Please share the folder with the service account email.")
-            raise
-            
+        service = build('drive', 'v3', credentials=_get_drive_credentials())
+
+        # Verify service account permissions (once per process)
+        if not _drive_verified.is_set():
+            try:
+                about = service.about().get(fields="user").execute()
+                logging.info(f"Drive service initialized for: {about.get('user', {}).get('emailAddress')}")
+                _drive_verified.set()
+            except HttpError as e:
+                if e.resp.status == 403:
+                    logging.error("Service account lacks necessary permissions. Please share the folder with the service account email.")
+                raise
+
+        _thread_services.drive = service
         return service
     except Exception as e:
         logging.error(f"Error initializing Drive service: {str(e)}")
         raise
 
+# Folder IDs verified this process; the folder is constant per run, so
+# one files.get suffices instead of two per upload
+_verified_folders = {}
+
 def verify_folder_access(service, folder_id):
-    """Verify folder exists and service account has access"""
+    """Verify folder exists and service account has access (cached per process)"""
+    cached = _verified_folders.get(folder_id)
+    if cached:
+        return cached
+
     try:
         # Clean folder ID
         clean_folder_id = folder_id.strip().strip('"').split('#')[0].strip()
-        
+
         # Try to get folder metadata
         folder = service.files().get(
             fileId=clean_folder_id,
             fields='id, name, mimeType'
         ).execute()
-        
+
         # Verify it's a folder
         if folder.get('mimeType') != 'application/vnd.google-apps.folder':
             raise ValueError(f"ID {clean_folder_id} is not a folder")
-            
+
         logging.info(f"Successfully verified access to folder: {folder.get('name')}")
+        _verified_folders[folder_id] = clean_folder_id
         return clean_folder_id
     except HttpError as e:
         if e.resp.status == 404:
@@ -68,12 +105,9 @@ def verify_folder_access(service, folder_id):
 def check_file_exists(service, filename, folder_id):
     """Check if file already exists in the specified folder"""
     try:
-        # Clean folder ID
+        # Clean folder ID; access is verified once per process by the callers
         clean_folder_id = folder_id.strip().strip('"').split('#')[0].strip()
-        
-        # Verify folder access first
-        clean_folder_id = verify_folder_access(service, clean_folder_id)
-        
+
         query = f"name='{filename}' and '{clean_folder_id}' in parents and trashed=false"
         results = service.files().list(
             q=query,
@@ -85,6 +119,41 @@ def check_file_exists(service, filename, folder_id):
         logging.error(f"Error checking file existence: {str(e)}")
         return []
 
+# name->id listing per folder, shared by all uploads in this process;
+# lock-guarded because uploads run on a thread pool
+_folder_listings = {}
+_folder_listings_lock = threading.Lock()
+
+def list_folder_filenames(service, folder_id):
+    """Return a name->id map of every live file in the folder, cached per process.
+
+    One paginated files.list replaces a files.list per uploaded filename;
+    the map is kept current locally as uploads and deletions happen.
+    """
+    with _folder_listings_lock:
+        if folder_id in _folder_listings:
+            return _folder_listings[folder_id]
+
+    files = {}
+    page_token = None
+    while True:
+        results = service.files().list(
+            q=f"'{folder_id}' in parents and trashed=false",
+            spaces='drive',
+            fields='nextPageToken, files(id, name)',
+            pageSize=1000,
+            pageToken=page_token
+        ).execute()
+        for file in results.get('files', []):
+            files[file['name']] = file['id']
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+
+    with _folder_listings_lock:
+        _folder_listings.setdefault(folder_id, files)
+        return _folder_listings[folder_id]
+
 def upload_file(service, file_path, folder_id):
     """Enhanced file upload with detailed progress reporting"""
     try:
@@ -101,117 +170,181 @@ def upload_file(service, file_path, folder_id):
             raise ValueError(f"File size ({file_size} bytes) exceeds limit ({MAX_FILE_SIZE} bytes)")
             
         file_name = os.path.basename(file_path)
-        
+
         # Verify folder access and clean ID
         print("🔍 Verifying folder access...")
         clean_folder_id = verify_folder_access(service, folder_id)
         print(f"📂 Using Drive folder ID: {clean_folder_id}")
-        
+
         # Optimize chunk size based on file size
         chunk_size = min(file_size, 5 * 1024 * 1024)  # 5MB chunks
         print(f"⚙️ Using chunk size: {chunk_size / (1024*1024):.2f} MB")
-        
-        # Check for existing files in parallel
-        print("🔍 Checking for existing files...")
-        check_start = time.time()
-        existing_files = check_file_exists(service, file_name, clean_folder_id)
-        check_duration = time.time() - check_start
-        print(f"✓ File check completed in {check_duration:.2f}s")
-        
-        # Delete existing files if any
-        if existing_files:
-            print(f"🗑️ Removing {len(existing_files)} existing file(s)...")
-            delete_start = time.time()
-            batch = service.new_batch_http_request()
-            for existing_file in existing_files:
-                batch.add(service.files().delete(fileId=existing_file['id']))
-            batch.execute()
-            delete_duration = time.time() - delete_start
-            print(f"✓ Deletion completed in {delete_duration:.2f}s")
-            logging.info(f"Deleted {len(existing_files)} existing files")
-        
+
+        _delete_existing_files(service, file_name, clean_folder_id)
+
         file_metadata = {
             'name': file_name,
             'parents': [clean_folder_id]
         }
-        
+
         print("📦 Preparing upload...")
-        media = MediaFileUpload(
-            file_path,
-            mimetype='image/png',
-            resumable=True,
-            chunksize=chunk_size
-        )
-        
-        retry_count = 0
-        max_retries = 5
-        while retry_count < max_retries:
-            try:
-                upload_start = time.time()
-                print("🚀 Initiating upload request...")
-                request = service.files().create(
-                    body=file_metadata,
-                    media_body=media,
-                    fields='id, webViewLink',
-                    supportsAllDrives=True
-                )
-                
-                response = None
-                last_progress = 0
-                last_update = time.time()
-                bytes_uploaded = 0
-                
-                print("\n📊 Upload Progress:")
-                while response is None:
-                    status, response = request.next_chunk()
-                    current_time = time.time()
-                    
-                    if status:
-                        progress = int(status.progress() * 100)
-                        if progress > last_progress:
-                            bytes_uploaded = int(file_size * (progress / 100))
-                            elapsed = current_time - upload_start
-                            speed = bytes_uploaded / (1024*1024*elapsed) if elapsed > 0 else 0
-                            eta = (file_size - bytes_uploaded) / (speed*1024*1024) if speed > 0 else 0
-                            
-                            print(f"├─ {progress}% complete")
-                            print(f"│  ├─ {bytes_uploaded/(1024*1024):.2f} MB / {file_size/(1024*1024):.2f} MB")
-                            print(f"│  ├─ Speed: {speed:.2f} MB/s")
-                            print(f"│  └─ ETA: {eta:.1f}s")
-                            
-                            last_progress = progress
-                            last_update = current_time
-                
-                upload_duration = time.time() - upload_start
-                total_duration = time.time() - start_time
-                
-                print("\n✅ Upload Summary:")
-                print(f"├─ Upload duration: {upload_duration:.2f}s")
-                print(f"├─ Average speed: {(file_size/1024/1024)/upload_duration:.2f} MB/s")
-                print(f"└─ Total process time: {total_duration:.2f}s")
-                
-                logging.info(f"File uploaded successfully: {response.get('webViewLink')}")
-                return response.get('id'), response.get('webViewLink')
-                
-            except HttpError as e:
-                retry_count += 1
-                if retry_count == max_retries:
-                    if e.resp.status == 403:
-                        raise ValueError(f"Permission denied. Please ensure the service account ({service._http.credentials.service_account_email}) has write access to the folder.")
-                    raise
-                wait_time = min(2 ** retry_count, 60)
-                print(f"\n⚠️ Upload attempt {retry_count} failed")
-                print(f"├─ Error: {str(e)}")
-                print(f"└─ Retrying in {wait_time}s...")
-                logging.warning(f"Upload attempt {retry_count} failed. Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
-                
+        mimetype = mimetypes.guess_type(file_name)[0] or 'image/png'
+        if file_size < RESUMABLE_THRESHOLD:
+            media = MediaFileUpload(file_path, mimetype=mimetype, resumable=False)
+        else:
+            media = MediaFileUpload(
+                file_path,
+                mimetype=mimetype,
+                resumable=True,
+                chunksize=chunk_size
+            )
+
+        return _upload_media(service, file_metadata, media, file_size, start_time)
+
     except Exception as e:
         error_msg = f"Error uploading file: {str(e)}"
         print(f"\n❌ {error_msg}")
         logging.error(error_msg)
         raise
 
+def upload_stream(service, stream, filename, folder_id, mimetype=None):
+    """Upload an in-memory screenshot buffer to Drive without touching disk"""
+    try:
+        start_time = time.time()
+        print("\n📤 Starting upload process...")
+
+        stream.seek(0, os.SEEK_END)
+        file_size = stream.tell()
+        stream.seek(0)
+        print(f"📁 Buffer size: {file_size / (1024*1024):.2f} MB")
+
+        if file_size == 0:
+            raise ValueError("Screenshot buffer is empty")
+        if file_size > MAX_FILE_SIZE:
+            raise ValueError(f"Buffer size ({file_size} bytes) exceeds limit ({MAX_FILE_SIZE} bytes)")
+
+        print("🔍 Verifying folder access...")
+        clean_folder_id = verify_folder_access(service, folder_id)
+        print(f"📂 Using Drive folder ID: {clean_folder_id}")
+
+        _delete_existing_files(service, filename, clean_folder_id)
+
+        file_metadata = {
+            'name': filename,
+            'parents': [clean_folder_id]
+        }
+
+        print("📦 Preparing upload...")
+        mimetype = mimetype or mimetypes.guess_type(filename)[0] or 'image/png'
+        if file_size < RESUMABLE_THRESHOLD:
+            media = MediaIoBaseUpload(stream, mimetype=mimetype, resumable=False)
+        else:
+            media = MediaIoBaseUpload(
+                stream,
+                mimetype=mimetype,
+                resumable=True,
+                chunksize=5 * 1024 * 1024  # match the file-upload path
+            )
+
+        return _upload_media(service, file_metadata, media, file_size, start_time)
+
+    except Exception as e:
+        error_msg = f"Error uploading stream: {str(e)}"
+        print(f"\n❌ {error_msg}")
+        logging.error(error_msg)
+        raise
+
+def _delete_existing_files(service, file_name, clean_folder_id):
+    """Remove a same-named file so the new upload replaces it"""
+    listing = list_folder_filenames(service, clean_folder_id)
+    existing_id = listing.get(file_name)
+    if existing_id:
+        print("🗑️ Removing existing file...")
+        delete_start = time.time()
+        service.files().delete(fileId=existing_id).execute()
+        with _folder_listings_lock:
+            listing.pop(file_name, None)
+        delete_duration = time.time() - delete_start
+        print(f"✓ Deletion completed in {delete_duration:.2f}s")
+        logging.info(f"Deleted existing file {file_name}")
+
+def _upload_media(service, file_metadata, media, file_size, start_time):
+    """Run the resumable upload with progress reporting and retries"""
+    retry_count = 0
+    max_retries = 5
+    while retry_count < max_retries:
+        try:
+            upload_start = time.time()
+            print("🚀 Initiating upload request...")
+            request = service.files().create(
+                body=file_metadata,
+                media_body=media,
+                fields='id, webViewLink',
+                supportsAllDrives=True
+            )
+
+            if not media.resumable():
+                # Small upload: one multipart POST carries metadata + bytes
+                response = request.execute()
+            else:
+                response = None
+                # Progress goes to interactive terminals only, at most once
+                # a second on one rewritten line - per-chunk multi-line
+                # prints are measurable overhead on synchronous stdout
+                interactive = os.isatty(1)
+                last_print = 0.0
+
+                while response is None:
+                    status, response = request.next_chunk()
+
+                    if status and interactive:
+                        current_time = time.time()
+                        if current_time - last_print >= 1.0:
+                            progress = int(status.progress() * 100)
+                            bytes_uploaded = int(file_size * status.progress())
+                            elapsed = current_time - upload_start
+                            speed = bytes_uploaded / (1024*1024*elapsed) if elapsed > 0 else 0
+                            sys.stdout.write(
+                                f"\r📊 {progress}% "
+                                f"{bytes_uploaded/(1024*1024):.1f}/{file_size/(1024*1024):.1f}MB "
+                                f"{speed:.1f}MB/s\033[K"
+                            )
+                            sys.stdout.flush()
+                            last_print = current_time
+
+                if interactive and last_print:
+                    sys.stdout.write("\n")
+
+            upload_duration = time.time() - upload_start
+            total_duration = time.time() - start_time
+
+            print("\n✅ Upload Summary:")
+            print(f"├─ Upload duration: {upload_duration:.2f}s")
+            print(f"├─ Average speed: {(file_size/1024/1024)/upload_duration:.2f} MB/s")
+            print(f"└─ Total process time: {total_duration:.2f}s")
+
+            logging.info(f"File uploaded successfully: {response.get('webViewLink')}")
+
+            with _folder_listings_lock:
+                listing = _folder_listings.get(file_metadata['parents'][0])
+                if listing is not None:
+                    listing[file_metadata['name']] = response.get('id')
+
+            return response.get('id'), response.get('webViewLink')
+
+        except HttpError as e:
+            retry_count += 1
+            if retry_count == max_retries:
+                if e.resp.status == 403:
+                    raise ValueError(f"Permission denied. Please ensure the service account ({service._http.credentials.service_account_email}) has write access to the folder.")
+                raise
+            wait_time = min(2 ** retry_count, 60)
+            print(f"\n⚠️ Upload attempt {retry_count} failed")
+            print(f"├─ Error: {str(e)}")
+            print(f"└─ Retrying in {wait_time}s...")
+            logging.warning(f"Upload attempt {retry_count} failed. Retrying in {wait_time} seconds...")
+            time.sleep(wait_time)
+
 def get_file_metadata(service, file_id):
     """Get file metadata with retry mechanism"""
     retry_count = 0
@@ -1,14 +1,20 @@
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+import functools
 import logging
 import time
 
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
 MAX_RETRIES = 3
 
+@functools.lru_cache(maxsize=1)
 def get_sheets_service():
-    """Initialize Google Sheets service with improved error handling"""
+    """Initialize Google Sheets service once per process.
+
+    Caching keeps the authenticated HTTP connection alive across calls
+    instead of rebuilding credentials and discovery each time.
+    """
     try:
         credentials = service_account.Credentials.from_service_account_file(
             'credentials.json', 
@@ -31,6 +37,10 @@ def validate_range(range_name):
         logging.error(f"Range validation error: {str(e)}")
         return False
 
+def _row_complete(row):
+    """True when all three metadata cells (title, link, thumbnail) are filled"""
+    return bool(row and len(row) == 3 and all(row))
+
 def is_url_processed(service, spreadsheet_id, row_index):
     """Check if URL already has metadata filled in the spreadsheet"""
     try:
@@ -39,14 +49,39 @@ def is_url_processed(service, spreadsheet_id, row_index):
             spreadsheetId=spreadsheet_id,
             range=metadata_range
         ).execute()
-        
+
         values = result.get('values', [])
-        # Check if we have all three metadata columns filled (title, link, thumbnail)
-        return bool(values and len(values[0]) == 3 and all(values[0]))
+        return _row_complete(values[0]) if values else False
     except Exception as e:
         logging.error(f"Error checking URL processing status: {str(e)}")
         return False
 
+def get_processed_mask(service, spreadsheet_id, num_rows):
+    """Fetch the metadata block once and return a per-row completeness mask.
+
+    One values.get on Sheet1!B2:D{N+1} replaces N per-row is_url_processed
+    round trips; callers check the list locally. The mask is padded with
+    False for rows the sheet has not materialized yet.
+    """
+    metadata_range = f'Sheet1!B2:D{num_rows + 1}'
+    result = service.spreadsheets().values().get(
+        spreadsheetId=spreadsheet_id,
+        range=metadata_range
+    ).execute()
+
+    mask = [_row_complete(row) for row in result.get('values', [])]
+    mask.extend([False] * (num_rows - len(mask)))
+    return mask
+
+def get_processed_rows(service, spreadsheet_id, num_rows):
+    """Return the set of row indices whose metadata is already complete"""
+    try:
+        mask = get_processed_mask(service, spreadsheet_id, num_rows)
+        return {i for i, done in enumerate(mask) if done}
+    except Exception as e:
+        logging.error(f"Error fetching processed rows: {str(e)}")
+        return set()
+
 def read_urls(service, spreadsheet_id, range_name):
     """Enhanced URL reading with validation and retry mechanism"""
     if not validate_range(range_name):
@@ -87,6 +122,41 @@ def read_urls(service, spreadsheet_id, range_name):
             
     raise Exception(f"Failed to read URLs after {MAX_RETRIES} attempts")
 
+def batch_update_metadata(service, spreadsheet_id, pending_writes):
+    """Write many (range, values) pairs in a single values.batchUpdate call"""
+    for range_name, _ in pending_writes:
+        if not validate_range(range_name):
+            raise ValueError(f"Invalid range format: {range_name}")
+
+    retry_count = 0
+    while retry_count < MAX_RETRIES:
+        try:
+            body = {
+                'valueInputOption': 'USER_ENTERED',
+                'data': [
+                    {'range': range_name, 'values': values}
+                    for range_name, values in pending_writes
+                ]
+            }
+
+            result = service.spreadsheets().values().batchUpdate(
+                spreadsheetId=spreadsheet_id,
+                body=body
+            ).execute()
+
+            logging.info(f"Sheet batch updated successfully: {result.get('totalUpdatedCells')} cells updated")
+            return result
+
+        except HttpError as e:
+            retry_count += 1
+            if retry_count == MAX_RETRIES:
+                raise
+            wait_time = retry_count * 2
+            logging.warning(f"Batch update attempt {retry_count} failed. Retrying in {wait_time} seconds...")
+            time.sleep(wait_time)
+
+    raise Exception(f"Failed to batch update sheet after {MAX_RETRIES} attempts")
+
 def update_metadata(service, spreadsheet_id, range_name, values):
     """Update sheet with metadata using batch update"""
     if not validate_range(range_name):
@@ -0,0 +1,36 @@
+"""Process-wide logging configuration.
+
+Worker threads log through a non-blocking queue drained by a single
+listener into a rotating file handler, replacing the per-module
+basicConfig calls and the import-time truncation of error_logs.txt.
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+
+LOG_FILE = 'error_logs.txt'
+_configured = False
+
+def configure_once():
+    """Attach the queue-backed rotating handler to the root logger (idempotent)"""
+    global _configured
+    if _configured:
+        return
+
+    log_queue = queue.Queue(-1)
+    file_handler = logging.handlers.RotatingFileHandler(
+        LOG_FILE, maxBytes=5_000_000, backupCount=3
+    )
+    file_handler.setFormatter(
+        logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    )
+
+    listener = logging.handlers.QueueListener(log_queue, file_handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    _configured = True
@@ -1,32 +1,103 @@
+"""Selenium/CDP helpers for driver lifecycle, cookies and full-page capture.
+
+Waiting invariant: the implicit wait is 0 and must stay 0. Mixing implicit
+and explicit waits makes every WebDriverWait poll block for the full
+implicit timeout; all waiting here goes through explicit WebDriverWait on
+concrete predicates.
+"""
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.by import By
+import base64
+import functools
+import itertools
+from collections import Counter
+import io
 import json
+import queue
 import os
 import logging
-import time
+import re
+import tempfile
+import urllib.request
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.common.exceptions import TimeoutException
-import math
 
-# Clear previous logs
-if os.path.exists('error_logs.txt'):
-    open('error_logs.txt', 'w').close()
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from .logging_setup import configure_once
+
+configure_once()
+
+# Output format for captures: webp cuts upload bytes 4-10x vs png.
+# Set SCREENSHOT_FORMAT=png to restore lossless output.
+SCREENSHOT_FORMAT = os.getenv('SCREENSHOT_FORMAT', 'webp').lower()
+SCREENSHOT_QUALITY = int(os.getenv('SCREENSHOT_QUALITY', '82'))
+
+# Pages above this pixel count are captured in horizontal strips so the
+# render surface stays bounded (a 30000x1920 page would otherwise need
+# ~230MB). Requires Pillow for reassembly.
+TILE_THRESHOLD_PIXELS = 40_000_000
+TILE_STRIP_HEIGHT = 8000
+
+# Ad/analytics requests blocked before the TCP handshake. Only hosts
+# that never affect how a page renders are blocked by default; add
+# aggressive patterns (e.g. *.woff*) through the comma-separated
+# BLOCK_URL_PATTERNS env var where fidelity permits, or set it empty to
+# disable blocking entirely.
+DEFAULT_BLOCK_PATTERNS = [
+    '*doubleclick.net*',
+    '*google-analytics.com*',
+    '*googletagmanager.com*',
+    '*facebook.net*',
+    '*hotjar.com*',
+    '*segment.io*'
+]
+BLOCK_URL_PATTERNS = [
+    pattern.strip()
+    for pattern in os.getenv('BLOCK_URL_PATTERNS', ','.join(DEFAULT_BLOCK_PATTERNS)).split(',')
+    if pattern.strip()
+]
 
-logging.basicConfig(
-    filename='error_logs.txt',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+# Extra patterns for metadata-only passes where pixels do not matter:
+# skipping media and webfont bytes makes driver.get several times faster
+# on heavy pages
+MEDIA_BLOCK_PATTERNS = [
+    '*.png', '*.jpg', '*.jpeg', '*.webp', '*.gif', '*.mp4', '*.woff*'
+]
 
+@functools.lru_cache(maxsize=1)
 def get_chrome_version(chrome_path):
-    """Get Chrome version from the executable"""
+    """Get the Chrome major version from the executable (memoized).
+
+    Tries the pywin32 file-version API first (~10x faster than wmic),
+    then `chrome --version`, then the deprecated wmic query last.
+    """
     import subprocess
     try:
-        # Different command format for Windows
+        import win32api
+        info = win32api.GetFileVersionInfo(chrome_path, '\\')
+        return str(info['FileVersionMS'] >> 16)
+    except Exception:
+        pass
+
+    try:
+        result = subprocess.run(
+            [chrome_path, '--version'],
+            capture_output=True, text=True, timeout=10
+        )
+        match = re.search(r'(\d+)\.', result.stdout)
+        if match:
+            return match.group(1)
+    except Exception:
+        pass
+
+    try:
+        # wmic is slow (~500ms) and removed on newer Windows; last resort
         escaped_path = chrome_path.replace('\\', '\\\\')
         cmd = 'wmic datafile where name="' + escaped_path + '" get Version /value'
         output = subprocess.check_output(cmd, shell=True)
@@ -36,52 +107,140 @@ def get_chrome_version(chrome_path):
         logging.error(f"Error getting Chrome version: {str(e)}")
         return None
 
+# Persistent ChromeDriver service shared by all sessions in this process
+# and reused across script invocations while the process stays alive.
+CHROMEDRIVER_PORT = int(os.getenv('CHROMEDRIVER_PORT', '9515'))
+_PID_FILE = os.path.join(tempfile.gettempdir(), 'chromedriver.pid')
+_service = None
+
+# Distinct disk-cache dir per session created in this process
+_cache_dir_ids = itertools.count()
+
+def _build_options():
+    """Build the Chrome options shared by every session"""
+    options = Options()
+    options.add_argument('--headless=new')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--disable-software-rasterizer')
+    options.add_argument('--disable-extensions')
+    options.add_argument('--disable-notifications')
+    options.add_argument('--dns-prefetch-disable')
+    options.add_argument('--disable-background-networking')
+    options.add_argument('--proxy-server="direct://"')
+    options.add_argument('--proxy-bypass-list=*')
+    options.add_argument('--disable-dev-tools')
+    options.add_argument('--disable-browser-side-navigation')
+    options.add_argument('--disable-site-isolation-trials')
+    # A real disk cache lets shared assets (fonts, CDN scripts, images)
+    # be fetched once and reused across every URL a session visits.
+    # Concurrent Chrome processes cannot share one cache directory, so
+    # each session gets its own; the pool builds sessions in a fixed
+    # order, making the dirs stable across runs for warm restarts.
+    options.add_argument(f'--disk-cache-size={256 * 1024 * 1024}')
+    cache_dir = os.path.join(
+        tempfile.gettempdir(), f'screenshot_http_cache_{next(_cache_dir_ids)}'
+    )
+    options.add_argument(f'--disk-cache-dir={cache_dir}')
+    # 'none' hands control back as soon as navigation starts; the capture
+    # path waits on explicit DOM/resource signals for what it needs
+    options.page_load_strategy = 'none'
+    options.add_experimental_option('prefs', {
+        'profile.default_content_setting_values.notifications': 2,
+        'profile.default_content_settings.popups': 0,
+        'profile.password_manager_enabled': False,
+        'profile.managed_default_content_settings.images': 1,
+        'profile.default_content_setting_values.cookies': 1,
+        'network.http.pipelining': True,
+        'network.http.proxy.pipelining': True,
+        'network.http.max-connections-per-server': 8
+    })
+    return options
+
+@functools.lru_cache(maxsize=1)
+def _get_driver_path():
+    """Resolve the chromedriver binary once per process.
+
+    ChromeDriverManager().install() performs a version check over the
+    network on every call; set CHROMEDRIVER_PATH to skip it entirely.
+    """
+    path = os.getenv('CHROMEDRIVER_PATH')
+    if path:
+        return path
+    return ChromeDriverManager().install()
+
+def _service_alive(service_url):
+    """Check whether a ChromeDriver already answers on service_url"""
+    try:
+        with urllib.request.urlopen(f"{service_url}/status", timeout=2) as resp:
+            return resp.status == 200
+    except Exception:
+        return False
+
+def start_service(port=CHROMEDRIVER_PORT):
+    """Start (or reuse) a persistent ChromeDriver service.
+
+    Returns the service URL. A ChromeDriver left running by a previous
+    invocation is reused, skipping the 2-4s process startup.
+    """
+    global _service
+    service_url = f"http://localhost:{port}"
+
+    if _service_alive(service_url):
+        logging.info(f"Reusing running ChromeDriver service at {service_url}")
+        return service_url
+
+    print("🔧 Starting ChromeDriver service...")
+    _service = Service(_get_driver_path(), port=port)
+    _service.start()
+    try:
+        with open(_PID_FILE, 'w') as f:
+            f.write(str(_service.process.pid))
+    except Exception as e:
+        logging.warning(f"Could not write ChromeDriver PID file: {str(e)}")
+    logging.info(f"ChromeDriver service started at {service_url}")
+    return service_url
+
+def connect_driver(service_url):
+    """Open a new browser session against a running ChromeDriver service.
+
+    Needs selenium >= 4.17: older releases only define execute_cdp_cmd on
+    the local ChromiumDriver, and everything downstream (network blocking,
+    cookie loading, capture, session reset) talks CDP.
+    """
+    return webdriver.Remote(command_executor=service_url, options=_build_options())
+
 def setup_driver():
     """Setup Chrome driver with optimized settings for performance and reliability"""
     try:
         print("\n🔍 Setting up Chrome WebDriver...")
-        
-        options = Options()
-        options.add_argument('--headless=new')
-        options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
-        options.add_argument('--disable-gpu')
-        options.add_argument('--disable-software-rasterizer')
-        options.add_argument('--disable-extensions')
-        options.add_argument('--disable-notifications')
-        options.add_argument('--dns-prefetch-disable')
-        options.add_argument('--disable-background-networking')
-        options.add_argument('--proxy-server="direct://"')
-        options.add_argument('--proxy-bypass-list=*')
-        options.add_argument('--disable-dev-tools')
-        options.add_argument('--disable-browser-side-navigation')
-        options.add_argument('--disable-site-isolation-trials')
-        options.page_load_strategy = 'eager'
-        options.add_experimental_option('prefs', {
-            'profile.default_content_setting_values.notifications': 2,
-            'profile.default_content_settings.popups': 0,
-            'profile.password_manager_enabled': False,
-            'profile.managed_default_content_settings.images': 1,
-            'profile.default_content_setting_values.cookies': 1,
-            'disk-cache-size': 4096,
-            'network.http.pipelining': True,
-            'network.http.proxy.pipelining': True,
-            'network.http.max-connections-per-server': 8
-        })
-        
-        print("🔧 Setting up ChromeDriver...")
-        driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-        
+
+        service_url = start_service()
+        driver = connect_driver(service_url)
+
         driver.set_page_load_timeout(20)
-        driver.implicitly_wait(5)
-        
+        driver.implicitly_wait(0)  # see module docstring: explicit waits only
+
+        # The Network domain must stay enabled for the whole session:
+        # setBlockedURLs and setBypassServiceWorker only act while it is
+        # on, and disabling it clears them. Nothing consumes the events,
+        # so tiny buffers keep the enabled domain's memory cost bounded.
         driver.execute_cdp_cmd('Network.enable', {
-            'maxTotalBufferSize': 100000000,
-            'maxResourceBufferSize': 100000000
+            'maxTotalBufferSize': 1048576,
+            'maxResourceBufferSize': 524288
         })
-        
+
         driver.execute_cdp_cmd('Network.setBypassServiceWorker', {'bypass': True})
-        
+
+        if BLOCK_URL_PATTERNS:
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCK_URL_PATTERNS})
+            logging.info(f"Blocking {len(BLOCK_URL_PATTERNS)} URL pattern(s)")
+
+        # Make sure DevTools hasn't left the HTTP cache bypassed; the
+        # shared disk cache only pays off if revisited assets hit it
+        driver.execute_cdp_cmd('Network.setCacheDisabled', {'cacheDisabled': False})
+
         print("✅ Chrome WebDriver setup complete!\n")
         return driver
     except Exception as e:
@@ -89,75 +248,103 @@ def setup_driver():
         raise
 
 def load_cookies(driver, cookies_path):
-    """Load cookies with optimized domain handling"""
+    """Load all cookies in a single CDP round-trip"""
     try:
         if not os.path.exists(cookies_path):
             logging.warning(f"Cookies file not found: {cookies_path}")
             return
-            
+
         with open(cookies_path, 'r') as f:
             cookies = json.load(f)
-            
+
         if not isinstance(cookies, list):
             raise ValueError("Invalid cookies format")
 
-        # Get unique domains from cookies
-        domains = {cookie.get('domain', '').lstrip('.') for cookie in cookies if cookie.get('domain')}
-        
-        # Set shorter timeout for cookie operations
-        original_timeout = driver.timeouts.page_load
-        driver.set_page_load_timeout(15)  # Reduced timeout for cookie operations
-        
-        for domain in domains:
-            if domain:
-                print(f"🌐 Setting up cookies for: {domain}")
-                try:
-                    # Use CDP to set cookies directly without navigation
-                    domain_cookies = [c for c in cookies if c.get('domain', '').endswith(domain)]
-                    
-                    # Batch cookie setting
-                    for cookie in domain_cookies:
-                        try:
-                            cookie_dict = {
-                                'name': cookie.get('name'),
-                                'value': cookie.get('value'),
-                                'domain': cookie.get('domain'),
-                                'path': cookie.get('path', '/'),
-                                'secure': cookie.get('secure', False),
-                                'httpOnly': cookie.get('httpOnly', False)
-                            }
-                            
-                            if 'expirationDate' in cookie:
-                                cookie_dict['expiry'] = int(cookie['expirationDate'])
-                            
-                            # Use CDP to set cookie
-                            driver.execute_cdp_cmd('Network.setCookie', cookie_dict)
-                            
-                        except Exception as e:
-                            print(f"⚠️ Error adding cookie {cookie.get('name', 'unknown')}: {str(e)}")
-                            continue
-                    
-                    # Quick validation
-                    cookies_added = driver.get_cookies()
-                    if cookies_added:
-                        print(f"✅ Added {len(cookies_added)} cookies for {domain}")
-                    
-                except Exception as e:
-                    print(f"⚠️ Error setting up cookies for {domain}: {str(e)}")
-                    continue
-        
-        # Restore original timeout
-        driver.set_page_load_timeout(original_timeout)
-        print("✅ Cookie setup completed")
-        logging.info("Cookie setup completed")
+        # Map the exported cookie format onto CDP's Network.setCookies shape
+        cdp_cookies = []
+        for cookie in cookies:
+            cookie_dict = {
+                'name': cookie.get('name'),
+                'value': cookie.get('value'),
+                'domain': cookie.get('domain'),
+                'path': cookie.get('path', '/'),
+                'secure': cookie.get('secure', False),
+                'httpOnly': cookie.get('httpOnly', False)
+            }
+
+            if cookie.get('sameSite') in ('Strict', 'Lax', 'None'):
+                cookie_dict['sameSite'] = cookie['sameSite']
+
+            if 'expirationDate' in cookie:
+                cookie_dict['expires'] = float(cookie['expirationDate'])
+
+            # CDP rejects null fields; drop any the export left unset
+            cdp_cookies.append({k: v for k, v in cookie_dict.items() if v is not None})
+
+        driver.execute_cdp_cmd('Network.setCookies', {'cookies': cdp_cookies})
+
+        # Per-domain counts from the local list, purely for diagnostics
+        domain_counts = Counter(
+            cookie.get('domain', '').lstrip('.') for cookie in cookies if cookie.get('domain')
+        )
+        for domain in sorted(domain_counts):
+            print(f"🌐 {domain_counts[domain]} cookie(s) set for {domain}")
+
+        print(f"✅ Cookie setup completed ({len(cdp_cookies)} cookies)")
+        logging.info(f"Cookie setup completed ({len(cdp_cookies)} cookies)")
     except Exception as e:
         error_msg = f"Error loading cookies: {str(e)}"
         print(f"❌ {error_msg}")
         logging.error(error_msg)
         raise
 
-def capture_full_page_screenshot(driver, url, output_path):
-    """Enhanced full-page screenshot capture with reliable height calculation"""
+def _capture_tiled(driver, width, height, strip_height=TILE_STRIP_HEIGHT):
+    """Capture a very tall page in strips to bound peak render memory.
+
+    Same total work as a single Page.captureScreenshot, but the clip keeps
+    each render surface to at most strip_height rows; Pillow reassembles
+    the strips and encodes the final image once.
+    """
+    logging.info(f"Capturing {width}x{height} page in strips of {strip_height}px")
+    page = Image.new('RGB', (width, height))
+    for y in range(0, height, strip_height):
+        tile = driver.execute_cdp_cmd('Page.captureScreenshot', {
+            'format': 'png',
+            'captureBeyondViewport': True,
+            'clip': {
+                'x': 0,
+                'y': y,
+                'width': width,
+                'height': min(strip_height, height - y),
+                'scale': 1
+            },
+            'fromSurface': True,
+            'optimizeForSpeed': True
+        })
+        with Image.open(io.BytesIO(base64.b64decode(tile['data']))) as tile_image:
+            page.paste(tile_image, (0, y))
+
+    buffer = io.BytesIO()
+    if SCREENSHOT_FORMAT in ('webp', 'jpeg'):
+        page.save(buffer, format=SCREENSHOT_FORMAT.upper(), quality=SCREENSHOT_QUALITY)
+    else:
+        page.save(buffer, format='PNG')
+    page.close()
+    return buffer.getvalue()
+
+def capture_full_page_screenshot(driver, url, output_path, block_media=False):
+    """Enhanced full-page screenshot capture with reliable height calculation.
+
+    output_path may be a filesystem path or a binary file-like object
+    (e.g. io.BytesIO) for callers that stream the bytes onward.
+    With block_media=True image/video/webfont requests are blocked for the
+    duration of the call - for metadata-only passes where the page title
+    matters but the pixels do not.
+    """
+    if block_media:
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {
+            'urls': BLOCK_URL_PATTERNS + MEDIA_BLOCK_PATTERNS
+        })
     try:
         print(f"🌐 Navigating to URL: {url}")
         logging.info(f"Navigating to URL: {url}")
@@ -165,8 +352,12 @@ def capture_full_page_screenshot(driver, url, output_path):
         
         print("⏳ Waiting for page load...")
         try:
-            WebDriverWait(driver, 30).until(
-                lambda d: d.execute_script('return document.readyState') == 'complete'
+            # With page_load_strategy 'none', driver.get returns as soon as
+            # navigation starts; wait only until the parse tree exists.
+            # Fonts, images and other subresources are awaited explicitly
+            # further down.
+            WebDriverWait(driver, 20).until(
+                lambda d: d.execute_script("return !!document.body && document.readyState !== 'loading'")
             )
             print("✅ Page loaded successfully")
             logging.info("Page loaded successfully")
@@ -176,18 +367,23 @@ def capture_full_page_screenshot(driver, url, output_path):
             logging.info(f"Current URL: {driver.current_url}")
             raise
         
-        # Wait for any dynamic content
-        time.sleep(2)
-        
+        # Wait for dynamic content: the font-ready promise resolves exactly
+        # when loading settles, so this is one round trip instead of polling
+        print("⏳ Waiting for dynamic content...")
+        try:
+            driver.set_script_timeout(5)
+            driver.execute_async_script("""
+                const done = arguments[arguments.length - 1];
+                const fonts = document.fonts ? document.fonts.ready : Promise.resolve();
+                fonts.then(() => done(true), () => done(true));
+            """)
+        except TimeoutException:
+            logging.warning(f"Dynamic content wait timed out, continuing: {url}")
+
         # Prepare page layout
         print("📏 Preparing page layout...")
         logging.info("Preparing page layout for screenshot")
         driver.execute_script("""
-            // Set up the page for proper height calculation
-            document.documentElement.style.display = 'table';
-            document.documentElement.style.width = '100%';
-            document.body.style.display = 'table-row';
-            
             // Force load lazy images
             document.querySelectorAll('img[loading="lazy"]').forEach(img => {
                 img.loading = 'eager';
@@ -203,9 +399,17 @@ def capture_full_page_screenshot(driver, url, output_path):
             });
         """)
         
-        # Wait for layout changes
-        time.sleep(1)
-        
+        # Wait for the layout mutations to settle instead of sleeping blindly
+        try:
+            WebDriverWait(driver, 5).until(
+                lambda d: d.execute_script(
+                    "return document.readyState === 'complete' && "
+                    "(document.fonts ? document.fonts.status === 'loaded' : true)"
+                )
+            )
+        except TimeoutException:
+            logging.warning("Layout settle wait timed out, continuing")
+
         # Get page dimensions
         dimensions = driver.execute_script("""
             return {
@@ -214,56 +418,70 @@ def capture_full_page_screenshot(driver, url, output_path):
                     document.documentElement.offsetWidth,
                     document.body.scrollWidth,
                     document.body.offsetWidth
-                ) + 100,
+                ),
                 height: Math.max(
                     document.documentElement.scrollHeight,
                     document.documentElement.offsetHeight,
                     document.body.scrollHeight,
                     document.body.offsetHeight
-                ) + 100
+                )
             };
         """)
-        
-        print(f"📐 Setting viewport size: {dimensions['width']}x{dimensions['height']} pixels")
-        logging.info(f"Setting viewport size: {dimensions['width']}x{dimensions['height']} pixels")
-        driver.set_window_size(dimensions['width'], dimensions['height'])
-        
-        # Wait for resize
-        time.sleep(1)
-        
-        # Scroll through the page to trigger lazy loading
+
+        print(f"📐 Page dimensions: {dimensions['width']}x{dimensions['height']} pixels")
+        logging.info(f"Page dimensions: {dimensions['width']}x{dimensions['height']} pixels")
+
+        # No scrolling needed: captureBeyondViewport renders offscreen
+        # content, so lazy media just needs its triggers rewritten once
         print("🖱️ Loading all content...")
-        logging.info("Scrolling through the page to load all content")
+        logging.info("Forcing lazy content to load eagerly")
         driver.execute_script("""
-            const height = document.documentElement.scrollHeight;
-            const steps = Math.ceil(height / 1000);
-            const stepSize = height / steps;
-            
-            // Synchronous scrolling with setTimeout
-            for (let i = 0; i <= steps; i++) {
-                setTimeout(() => {
-                    window.scrollTo(0, i * stepSize);
-                }, i * 100);
-            }
-            setTimeout(() => window.scrollTo(0, 0), (steps + 1) * 100);
+            document.querySelectorAll('img[data-src]').forEach(i => { i.src = i.dataset.src; });
+            document.querySelectorAll('source[data-srcset]').forEach(s => { s.srcset = s.dataset.srcset; });
         """)
-        
-        # Wait for scrolling to complete
-        time.sleep((math.ceil(driver.execute_script("return document.documentElement.scrollHeight") / 1000) + 1) * 0.1 + 1)
-        
+
+        # Wait for every image to settle (load or error), with a hard cap
+        try:
+            driver.set_script_timeout(5)
+            driver.execute_async_script("""
+                const done = arguments[arguments.length - 1];
+                Promise.all(
+                    [...document.images]
+                        .filter(i => !i.complete)
+                        .map(i => new Promise(r => { i.onload = i.onerror = r; }))
+                ).then(() => done(true));
+            """)
+        except TimeoutException:
+            logging.warning("Image load wait timed out, continuing")
+
         print("📸 Capturing screenshot...")
         logging.info("Capturing screenshot")
-        try:
-            body = driver.find_element(By.TAG_NAME, 'body')
-            body.screenshot(output_path)
-            print("✅ Captured using body element method")
-            logging.info("Screenshot captured using body element method")
-        except Exception as e:
-            logging.warning(f"Body capture failed, using full page method: {str(e)}")
-            driver.save_screenshot(output_path)
-            print("✅ Captured using full page method")
-            logging.info("Screenshot captured using full page method")
-        
+        if Image is not None and dimensions['width'] * dimensions['height'] > TILE_THRESHOLD_PIXELS:
+            data = _capture_tiled(driver, dimensions['width'], dimensions['height'])
+        else:
+            capture_params = {
+                'format': SCREENSHOT_FORMAT,
+                'captureBeyondViewport': True,
+                'clip': {
+                    'x': 0,
+                    'y': 0,
+                    'width': dimensions['width'],
+                    'height': dimensions['height'],
+                    'scale': 1
+                },
+                'fromSurface': True,
+                'optimizeForSpeed': True
+            }
+            if SCREENSHOT_FORMAT in ('webp', 'jpeg'):
+                capture_params['quality'] = SCREENSHOT_QUALITY
+            screenshot = driver.execute_cdp_cmd('Page.captureScreenshot', capture_params)
+            data = base64.b64decode(screenshot['data'])
+        if hasattr(output_path, 'write'):
+            output_path.write(data)
+        else:
+            with open(output_path, 'wb') as f:
+                f.write(data)
+
         page_title = driver.title
         print(f"✅ Screenshot captured successfully: {page_title}")
         logging.info(f"Screenshot captured successfully for {url}")
@@ -274,6 +492,63 @@ def capture_full_page_screenshot(driver, url, output_path):
         print(error_msg)
         logging.error(error_msg, exc_info=True)
         raise
+    finally:
+        if block_media:
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCK_URL_PATTERNS})
+
+class DriverPool:
+    """Pool of pre-warmed browser sessions shared by worker threads.
+
+    Sessions are built once against the persistent ChromeDriver service,
+    with cookies loaded, and handed out through a queue so parallel
+    workers never race on driver creation.
+    """
+    def __init__(self, size, cookies_path=None):
+        self._pool = queue.Queue()
+        self._drivers = []
+        try:
+            for _ in range(size):
+                driver = setup_driver()
+                self._drivers.append(driver)
+                if cookies_path:
+                    load_cookies(driver, cookies_path)
+                self._pool.put(driver)
+        except Exception:
+            # A partially built pool is never handed to the caller, so
+            # quit the sessions already started - otherwise they stay
+            # alive on the persistent ChromeDriver service forever
+            self.close_all()
+            raise
+
+    def acquire(self):
+        """Take a driver from the pool, blocking until one is free"""
+        return self._pool.get()
+
+    def release(self, driver):
+        """Return a driver to the pool"""
+        self._pool.put(driver)
+
+    def close_all(self):
+        """Quit every driver in the pool"""
+        for driver in self._drivers:
+            close_driver(driver)
+        self._drivers.clear()
+
+def reset_session(driver):
+    """Soft-reset browser state so a hung page cannot poison the next URL.
+
+    Stops any in-flight load and drops service workers and cache storage -
+    roughly 100ms against ~3s for recreating the whole driver.
+    """
+    try:
+        driver.execute_cdp_cmd('Page.stopLoading', {})
+        driver.execute_cdp_cmd('Storage.clearDataForOrigin', {
+            'origin': '*',
+            'storageTypes': 'service_workers,cache_storage'
+        })
+        logging.info("Browser session soft-reset")
+    except Exception as e:
+        logging.warning(f"Session reset failed: {str(e)}")
 
 def close_driver(driver):
     """Safely close the driver with validation"""
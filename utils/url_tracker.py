@@ -2,44 +2,106 @@
 import os
 import json
 import logging
+import threading
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _dumps(obj):
+    """Serialize one log entry; orjson is a 2-10x faster C extension"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+def _loads(line):
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
 class URLTracker:
-    def __init__(self, tracking_file="processed_urls.json"):
+    def __init__(self, tracking_file="processed_urls.jsonl"):
         self.tracking_file = tracking_file
+        # Writes come from the upload thread pool; the lock keeps JSONL
+        # lines from interleaving
+        self._write_lock = threading.Lock()
+        migrating = (not os.path.exists(self.tracking_file)
+                     and os.path.exists('processed_urls.json'))
         self.processed_urls = self._load_processed_urls()
-        
+        self._fp = open(self.tracking_file, 'a')
+        if migrating and self.processed_urls:
+            # Persist the legacy entries into the new log now; opening in
+            # append mode just created the file, so without this the next
+            # run would no longer see the legacy dump and history would
+            # silently vanish
+            with self._write_lock:
+                for url, record in self.processed_urls.items():
+                    self._fp.write(_dumps({'url': url, **record}) + '\n')
+                self._fp.flush()
+            logging.info(f"Migrated {len(self.processed_urls)} URL(s) from legacy tracking file")
+
     def _load_processed_urls(self):
-        """Load previously processed URLs from tracking file"""
+        """Rebuild the processed-URL dict from the append-only log"""
+        processed = {}
         try:
             if os.path.exists(self.tracking_file):
                 with open(self.tracking_file, 'r') as f:
-                    return json.load(f)
-            return {}
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        entry = _loads(line)
+                        processed[entry['url']] = {
+                            'processed_at': entry.get('processed_at'),
+                            'metadata': entry.get('metadata', {})
+                        }
+            elif os.path.exists('processed_urls.json'):
+                # Legacy full-dump format from before the append-only log
+                with open('processed_urls.json', 'r') as f:
+                    processed = json.load(f)
+            return processed
         except Exception as e:
             logging.error(f"Error loading processed URLs: {str(e)}")
-            return {}
-            
-    def _save_processed_urls(self):
-        """Save processed URLs to tracking file"""
+            return processed
+
+    def _append_entry(self, url, record):
+        """Append one record to the log; O(1) per URL instead of a full rewrite"""
         try:
-            with open(self.tracking_file, 'w') as f:
-                json.dump(self.processed_urls, f, indent=2)
+            with self._write_lock:
+                self._fp.write(_dumps({'url': url, **record}) + '\n')
+                self._fp.flush()
         except Exception as e:
-            logging.error(f"Error saving processed URLs: {str(e)}")
-            
+            logging.error(f"Error saving processed URL: {str(e)}")
+
     def is_url_processed(self, url):
         """Check if URL has been processed successfully"""
         return url in self.processed_urls
-        
+
     def mark_url_processed(self, url, metadata=None):
         """Mark URL as processed with optional metadata"""
-        self.processed_urls[url] = {
+        record = {
             'processed_at': datetime.now().isoformat(),
             'metadata': metadata or {}
         }
-        self._save_processed_urls()
-        
+        self.processed_urls[url] = record
+        self._append_entry(url, record)
+
     def get_url_metadata(self, url):
         """Get metadata for processed URL"""
-        return self.processed_urls.get(url, {}).get('metadata', {}) 
\ No newline at end of file
+        return self.processed_urls.get(url, {}).get('metadata', {})
+
+    def compact(self):
+        """Rewrite the log with one entry per URL and swap it in atomically"""
+        try:
+            with self._write_lock:
+                temp_file = self.tracking_file + '.tmp'
+                with open(temp_file, 'w') as f:
+                    for url, record in self.processed_urls.items():
+                        f.write(_dumps({'url': url, **record}) + '\n')
+                self._fp.close()
+                os.replace(temp_file, self.tracking_file)
+                self._fp = open(self.tracking_file, 'a')
+        except Exception as e:
+            logging.error(f"Error compacting tracking file: {str(e)}")